@@ -52,6 +52,7 @@ class EmbeddingMap:
         self.object_current_key = 0
         self.object_forward_map = {}
         self.object_reverse_map = {}
+        self.rpc_or_subkernel_present = False
         self.module_map = {}
 
         # type_map connects the host Python `type` to the pair of associated
@@ -167,6 +168,8 @@ class EmbeddingMap:
         self.object_current_key += 1
         self.object_forward_map[self.object_current_key] = obj_ref
         self.object_reverse_map[obj_id] = self.object_current_key
+        if inspect.isfunction(obj_ref) or inspect.ismethod(obj_ref):
+            self.rpc_or_subkernel_present = True
         return self.object_current_key
 
     def retrieve_object(self, obj_key):
@@ -194,8 +197,7 @@ class EmbeddingMap:
         return subkernels
 
     def has_rpc_or_subkernel(self):
-        return any(filter(lambda x: inspect.isfunction(x) or inspect.ismethod(x),
-                          self.object_forward_map.values()))
+        return self.rpc_or_subkernel_present
 
 
 class ASTSynthesizer:
@@ -58,7 +58,7 @@ class AD9914:
     """
 
     kernel_invariants = {"core", "sysclk", "bus_channel", "channel",
-        "rtio_period_mu", "sysclk_per_mu", "write_duration_mu",
+        "ftw_per_hz", "rtio_period_mu", "sysclk_per_mu", "write_duration_mu",
         "dac_cal_duration_mu", "init_duration_mu", "init_sync_duration_mu",
         "set_duration_mu", "set_x_duration_mu", "exit_x_duration_mu"}
 
@@ -69,6 +69,7 @@ class AD9914:
         self.channel     = channel
         self.phase_mode  = PHASE_MODE_CONTINUOUS
 
+        self.ftw_per_hz            = float(int64(2)**32)/sysclk
         self.rtio_period_mu        = int64(8)
         self.sysclk_per_mu         = int32(self.sysclk * self.core.ref_period)
 
@@ -246,26 +247,26 @@ class AD9914:
         """Returns the 32-bit frequency tuning word corresponding to the given
         frequency.
         """
-        return int32(round(float(int64(2)**32*frequency/self.sysclk)))
+        return int32(round(self.ftw_per_hz*frequency))
 
     @portable(flags={"fast-math"})
     def ftw_to_frequency(self, ftw):
         """Returns the frequency corresponding to the given frequency tuning
         word.
         """
-        return ftw*self.sysclk/int64(2)**32
+        return ftw/self.ftw_per_hz
 
     @portable(flags={"fast-math"})
     def turns_to_pow(self, turns):
         """Returns the 16-bit phase offset word corresponding to the given
         phase in turns."""
-        return round(float(turns*2**16)) & 0xffff
+        return round(float(turns*0x10000)) & 0xffff
 
     @portable(flags={"fast-math"})
     def pow_to_turns(self, pow):
         """Returns the phase in turns corresponding to the given phase offset
         word."""
-        return pow/2**16
+        return pow/0x10000
 
     @portable(flags={"fast-math"})
     def amplitude_to_asf(self, amplitude):
@@ -1,12 +1,10 @@
 #!/usr/bin/env python3
 
-import os, sys, logging, argparse
+import os, sys, logging, argparse, hashlib, shutil
 
 from sipyco import common_args
 
 from artiq import __version__ as artiq_version
-from artiq.master.databases import DeviceDB, DatasetDB
-from artiq.master.worker_db import DeviceManager, DatasetManager
 from artiq.language.environment import ProcessArgumentManager
 from artiq.coredevice.core import CompileError
 from artiq.tools import *
@@ -40,10 +38,51 @@ def get_argparser():
     return parser
 
 
+def compile_cache_key(args, arguments):
+    h = hashlib.blake2b()
+    h.update(artiq_version.encode())
+    for filename in args.file, args.device_db:
+        with open(filename, "rb") as f:
+            h.update(f.read())
+    h.update(repr(args.class_name).encode())
+    h.update(repr(sorted(arguments.items())).encode())
+    return h.hexdigest()
+
+
 def main():
     args = get_argparser().parse_args()
     common_args.init_logger_from_args(args)
 
+    arguments = parse_arguments(args.arguments)
+
+    output = args.output
+    if output is None:
+        basename, ext = os.path.splitext(args.file)
+        output = "{}.elf".format(basename)
+
+    # Opt-in content-addressed cache of compiled kernels. Note that the key
+    # covers the experiment file, device database, class name and run
+    # arguments, but not dataset contents: do not enable it for experiments
+    # that embed dataset values into kernels.
+    cache_dir = os.getenv("ARTIQ_COMPILE_CACHE")
+    cache_file = None
+    if cache_dir is not None:
+        try:
+            cache_file = os.path.join(
+                cache_dir, compile_cache_key(args, arguments) + ".elf")
+        except OSError:
+            logger.warning("failed to hash compilation inputs, "
+                           "not using compilation cache", exc_info=True)
+        if cache_file is not None and os.path.exists(cache_file):
+            logger.info("using cached kernel library %s", cache_file)
+            shutil.copyfile(cache_file, output)
+            return
+
+    # deferred so that --help/--version do not load the lmdb-backed
+    # database machinery
+    from artiq.master.databases import DeviceDB, DatasetDB
+    from artiq.master.worker_db import DeviceManager, DatasetManager
+
     device_mgr = DeviceManager(DeviceDB(args.device_db))
     dataset_db = DatasetDB(args.dataset_db)
     try:
@@ -52,7 +91,6 @@ def main():
         try:
             module = file_import(args.file, prefix="artiq_run_")
             exp = get_experiment(module, args.class_name)
-            arguments = parse_arguments(args.arguments)
             argument_mgr = ProcessArgumentManager(arguments)
             exp_inst = exp((device_mgr, dataset_mgr, argument_mgr, {}))
             argument_mgr.check_unprocessed_arguments()
@@ -76,13 +114,15 @@ def main():
     if object_map.has_rpc_or_subkernel():
         raise ValueError("Experiment must not use RPC or subkernels")
 
-    output = args.output
-    if output is None:
-        basename, ext = os.path.splitext(args.file)
-        output = "{}.elf".format(basename)
-
     with open(output, "wb") as f:
         f.write(kernel_library)
 
+    if cache_file is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = "{}.tmp{}".format(cache_file, os.getpid())
+        with open(tmp_file, "wb") as f:
+            f.write(kernel_library)
+        os.replace(tmp_file, cache_file)
+
 if __name__ == "__main__":
     main()